@@ -1,12 +1,35 @@
+import importlib
 import logging
-from lvis.lvis import LVIS
-from lvis.results import LVISResults
-from lvis.eval import LVISEval
-from lvis.vis import LVISVis
+from lvis.lvis import LVIS, download_urls, fetch_urls, load_categories, write_json
 
 logging.basicConfig(
     format="[%(asctime)s] %(name)s %(levelname)s: %(message)s", datefmt="%m/%d %H:%M:%S",
     level=logging.WARN,
 )
 
-__all__ = ["LVIS", "LVISResults", "LVISEval", "LVISVis"]
+__all__ = [
+    "LVIS",
+    "LVISResults",
+    "LVISEval",
+    "LVISVis",
+    "download_urls",
+    "fetch_urls",
+    "load_categories",
+    "write_json",
+]
+
+# results, eval and vis pull in pycocotools, cv2 and matplotlib; import them on
+# first access so that code only using LVIS does not pay for it
+_LAZY_IMPORTS = {
+    "LVISResults": "lvis.results",
+    "LVISEval": "lvis.eval",
+    "LVISVis": "lvis.vis",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError("module {} has no attribute {}".format(__name__, name))
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    globals()[name] = value
+    return value
@@ -1,9 +1,9 @@
-from lvis import LVIS
+from lvis import LVIS, download_urls, load_categories, write_json
 from collections import defaultdict
-import json
+import os
 
 
-def get_categories_alphabetized(json_path):
+def get_categories_alphabetized(categories):
     """
     Reads a JSON file containing LVIS categories and returns the
     categories alphabetized.
@@ -12,13 +12,14 @@ def get_categories_alphabetized(json_path):
     at least has an 'name' field.
     
     Args:
-        json_path (str): Path to the 'lvis_categories.json' file.
+        categories (str or list): Path to the 'lvis_categories.json' file,
+            or the already loaded list of category objects.
     
     Returns:
         list: Top 25 category objects (sorted descending by image_count).
     """
-    with open(json_path, 'r', encoding='utf-8') as f:
-        categories = json.load(f)
+    if isinstance(categories, str):
+        categories = load_categories(categories)
 
     # Sort by name ascending
     categories_sorted = sorted(categories, key=lambda cat: cat['name'], reverse=False)
@@ -26,47 +27,83 @@ def get_categories_alphabetized(json_path):
     # Return all
     return categories_sorted
 
-def write_to_json(json_path, data):
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-
-# Example usage:
-if __name__ == "__main__":
-    json_path = "lvis_categories_train_govivid_56.json"
-    govivid_56 = get_categories_alphabetized(json_path)
-    for cat in govivid_56:
-        print(f"ID: {cat['id']} | image_count: {cat['image_count']} | name/synset: {cat['synset']}")
-    
-    train_obj = LVIS("../dataset/lvis_v1_train.json")
-    val_obj = LVIS("../dataset/lvis_v1_val.json")
-    test_obj = LVIS("../dataset/lvis_v1_image_info_test_dev.json")
+def run_pipeline(categories, splits, out_root):
+    """
+    Downloads the images of the given categories for every split and exports
+    their labels in YOLO format, using the position of each category in
+    `categories` as its class index.
 
-    images_folder_path_train = "test/govivid_56/images/train"
-    labels_folder_path_train = "test/govivid_56/labels/train"
+    Images go to '<out_root>/images/<split>' and labels to
+    '<out_root>/labels/<split>'.
 
-    images_folder_path_val = "test/govivid_56/images/val"
-    labels_folder_path_val = "test/govivid_56/labels/val"
+    Args:
+        categories (list): category objects, in class index order.
+        splits (list): (split name, LVIS object) pairs, e.g. ('train', train_obj).
+        out_root (str): Root directory of the exported dataset.
 
-    images_folder_path_test = "test/govivid_56/images/test"
-    labels_folder_path_test = "test/govivid_56/labels/test"
+    Returns:
+        dict: class index -> category name, for the detect yaml.
+    """
+    folders = [
+        (split_obj, f"{out_root}/images/{split}", f"{out_root}/labels/{split}")
+        for split, split_obj in splits
+    ]
+    # List every images folder once, instead of once per category
+    existing_images = [
+        set(os.listdir(images_folder_path)) if os.path.isdir(images_folder_path) else set()
+        for _, images_folder_path, _ in folders
+    ]
 
+    # Gather the images of every category and split first, so they can all be
+    # fetched from one download pool. The set drops images shared by several
+    # categories.
     detect_yaml = defaultdict(list)
-    category_index = 0
-    for category in govivid_56:
+    download_jobs = set()
+    for category_index, category in enumerate(categories):
         print(f"name: {category['name']} , category_index = {category_index}")
         # Group categories by their index for easy lookup in yaml
         detect_yaml[category_index] = category["name"]
         category_id = category["id"]
-        train_obj.download_images_for_category(images_folder_path_train, category_id)
-        train_obj.export_labels(labels_folder_path_train, category_id, category_index)
+        for (split_obj, images_folder_path, _), existing in zip(folders, existing_images):
+            image_ids_for_category = split_obj.get_image_ids(category_id)
+            download_jobs.update(split_obj.get_download_jobs(
+                images_folder_path, image_ids_for_category, existing=existing
+            ))
+
+    for _, images_folder_path, _ in folders:
+        os.makedirs(images_folder_path, exist_ok=True)
+    # A failed image is reported and skipped, so that it does not abort the
+    # downloads and label exports of every other category
+    download_jobs = list(download_jobs)
+    errors = download_urls(download_jobs, concurrency=128, return_exceptions=True)
+    for (url, _), error in zip(download_jobs, errors):
+        if error is not None:
+            print(f"Warning: Failed to download image from {url}: {error}")
 
-        val_obj.download_images_for_category(images_folder_path_val, category_id)
-        val_obj.export_labels(labels_folder_path_val, category_id, category_index)
+    for category_index, category in enumerate(categories):
+        for split_obj, _, labels_folder_path in folders:
+            split_obj.export_labels(labels_folder_path, category["id"], category_index)
 
-        test_obj.download_images_for_category(images_folder_path_test, category_id)
-        test_obj.export_labels(labels_folder_path_test, category_id, category_index)
+    return detect_yaml
+
+# Example usage:
+if __name__ == "__main__":
+    # Each LVIS split is loaded once and shared by every category set
+    train_obj = LVIS("../dataset/lvis_v1_train.json")
+    val_obj = LVIS("../dataset/lvis_v1_val.json")
+    test_obj = LVIS("../dataset/lvis_v1_image_info_test_dev.json")
+    splits = [("train", train_obj), ("val", val_obj), ("test", test_obj)]
 
-        #end of the loop, increase category index
-        category_index += 1
+    category_sets = {
+        "top_25": "lvis_categories_train_top_25.json",
+        "govivid_56": "lvis_categories_train_govivid_56.json",
+        "govivid_62": "lvis_categories_train_govivid_62.json",
+        "govivid_95": "lvis_categories_train_govivid_95.json",
+    }
+    for name, json_path in category_sets.items():
+        categories = get_categories_alphabetized(load_categories(json_path))
+        for cat in categories:
+            print(f"ID: {cat['id']} | image_count: {cat['image_count']} | name/synset: {cat['synset']}")
 
-    write_to_json("govivid_56_detect_yaml.json", detect_yaml)
\ No newline at end of file
+        detect_yaml = run_pipeline(categories, splits, f"test/{name}")
+        write_json(f"{name}_detect_yaml.json", detect_yaml)
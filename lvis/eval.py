@@ -52,8 +52,7 @@ class LVISEval:
         self.params.cat_ids = sorted(self.lvis_gt.get_cat_ids())
 
     def _to_mask(self, anns, lvis):
-        for ann in anns:
-            rle = lvis.ann_to_rle(ann)
+        for ann, rle in zip(anns, lvis.anns_to_rles(anns)):
             ann["segmentation"] = rle
 
     def _prepare(self):
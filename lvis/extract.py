@@ -1,5 +1,5 @@
-import json
-from lvis import LVIS
+import heapq
+from lvis import LVIS, load_categories, write_json
 from collections import defaultdict
 from custom_categories import lvis_category_names_govivid_56
 
@@ -15,7 +15,7 @@ val_obj = LVIS("../dataset/lvis_v1_val.json")
 
 # read json file 'lvis_categories.json'
 # return the 25 objects where the field "image_count" is highest
-def get_top_25_categories_by_image_count(json_path):
+def get_top_25_categories_by_image_count(categories):
     """
     Reads a JSON file containing LVIS categories and returns the
     25 categories with the highest 'image_count'.
@@ -24,21 +24,19 @@ def get_top_25_categories_by_image_count(json_path):
     at least has an 'image_count' field.
 
     Args:
-        json_path (str): Path to the 'lvis_categories.json' file.
+        categories (str or list): Path to the 'lvis_categories.json' file,
+            or the already loaded list of category objects.
     
     Returns:
         list: Top 25 category objects (sorted descending by image_count).
     """
-    with open(json_path, 'r', encoding='utf-8') as f:
-        categories = json.load(f)
+    if isinstance(categories, str):
+        categories = load_categories(categories)
 
-    # Sort by image_count descending
-    categories_sorted = sorted(categories, key=lambda cat: cat['image_count'], reverse=True)
+    # Return the top 25 by image_count, descending
+    return heapq.nlargest(25, categories, key=lambda cat: cat['image_count'])
 
-    # Return the top 25
-    return categories_sorted[:25]
-
-def get_categories_by_name(json_path, name_array):
+def get_categories_by_name(categories, name_array):
     """
     Accepts an string array containing names of LVIS categories and 
     reads a JSON file containing LVIS categories.
@@ -49,16 +47,18 @@ def get_categories_by_name(json_path, name_array):
     The function returns the JSON objects where the 'name' field matches a name in the string array.
     
     Args:
-        json_path (str): Path to the 'lvis_categories.json' file.
+        categories (str or list): Path to the 'lvis_categories.json' file,
+            or the already loaded list of category objects.
     
     Returns:
         list: objects of matching LVIS categories (sorted descending by image_count).
     """
-    with open(json_path, 'r', encoding='utf-8') as f:
-        categories = json.load(f)
+    if isinstance(categories, str):
+        categories = load_categories(categories)
 
-    # Filter categories by name
-    filtered_categories = [cat for cat in categories if cat.get('synset') in name_array]
+    # Filter categories by name, using a set for O(1) membership tests
+    name_set = name_array if isinstance(name_array, (set, frozenset)) else frozenset(name_array)
+    filtered_categories = [cat for cat in categories if cat['synset'] in name_set]
     
     # # Sort by image_count in descending order
     # sorted_categories = sorted(filtered_categories, key=lambda x: x.get('image_count', 0), reverse=True)
@@ -67,16 +67,13 @@ def get_categories_by_name(json_path, name_array):
     return filtered_categories
 
 
-def write_to_json(json_path, data):
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-
 # Example usage:
 if __name__ == "__main__":
     json_path = "lvis_categories_train.json"
-    categories_govivid_56 = get_categories_by_name(json_path, lvis_category_names_govivid_56)
+    categories = load_categories(json_path)
+    categories_govivid_56 = get_categories_by_name(categories, lvis_category_names_govivid_56)
     for cat in categories_govivid_56:
         print(f"ID: {cat['id']} | image_count: {cat['image_count']} | name/synset: {cat['synset']}")
 
     govivid_56_json_path = "lvis_categories_train_govivid_56.json"
-    write_to_json(govivid_56_json_path, categories_govivid_56)
\ No newline at end of file
+    write_json(govivid_56_json_path, categories_govivid_56)
\ No newline at end of file
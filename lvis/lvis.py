@@ -6,61 +6,399 @@ the annotations in LVIS. In addition to this API, please download
 images and annotations from the LVIS website.
 """
 
+import asyncio
+import functools
 import json
 import os
 import logging
+import mmap
+import pickle
 from collections import defaultdict
-from urllib.request import urlretrieve
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 
-import pycocotools.mask as mask_utils
+import numpy as np
 
 import csv
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+
+    @njit(cache=True, parallel=True)
+    def _cat_area_mask(ann_cat, ann_area, cats_sorted, lo, hi):
+        # fuses the category membership test and both area comparisons into
+        # one parallel pass; cats_sorted must be sorted for searchsorted
+        mask = np.empty(ann_cat.shape[0], dtype=np.bool_)
+        num_cats = cats_sorted.shape[0]
+        for i in prange(ann_cat.shape[0]):
+            pos = np.searchsorted(cats_sorted, ann_cat[i])
+            mask[i] = (
+                pos < num_cats
+                and cats_sorted[pos] == ann_cat[i]
+                and lo < ann_area[i] < hi
+            )
+        return mask
+
+    @njit(cache=True)
+    def _bboxes_to_yolo_loop(bboxes, img_width, img_height, out):
+        # same operations as the NumPy version of bboxes_to_yolo, so both
+        # produce identical values; no fastmath for the same reason
+        for i in range(bboxes.shape[0]):
+            x = bboxes[i, 0]
+            y = bboxes[i, 1]
+            w = bboxes[i, 2]
+            h = bboxes[i, 3]
+            out[i, 0] = (x + w / 2.0) / img_width
+            out[i, 1] = (y + h / 2.0) / img_height
+            out[i, 2] = w / img_width
+            out[i, 3] = h / img_height
+
+
+# default area range of get_ann_ids, i.e. no area filtering
+_AREA_RNG_ALL = (0, float("inf"))
+
+# layout version of the cache_index pickle; bump it whenever the attributes
+# set up by _create_index change, so that older caches are rebuilt
+_INDEX_CACHE_VERSION = 1
+
+
+async def fetch_urls(jobs, concurrency=64, return_exceptions=False, timeout=30):
+    """Download urls concurrently over a shared connection pool.
+    Args:
+        jobs (list of (str, str)): (url, file_name) pairs to download
+        concurrency (int): max number of simultaneous connections
+        return_exceptions (bool): return the errors of failed downloads
+        instead of raising the first one
+        timeout (float): seconds to wait for a connection or for data from
+        the server before a download fails
+
+    Returns:
+        results (list): None for each successful download, in job order
+    """
+    if aiohttp is None:
+        raise ImportError("fetch_urls requires aiohttp.")
+
+    async def _fetch(session, url, file_name):
+        async with session.get(url) as response:
+            response.raise_for_status()
+            data = await response.read()
+        # only write once the whole body arrived, so an interrupted run never
+        # leaves a truncated image that later runs would skip
+        with open(file_name, "wb") as f:
+            f.write(data)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    # same meaning as the requests timeout of fetch_urls_threaded; no total
+    # timeout, as that would also count the time spent waiting for the pool
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=client_timeout
+    ) as session:
+        return await asyncio.gather(
+            *(_fetch(session, url, file_name) for url, file_name in jobs),
+            return_exceptions=return_exceptions,
+        )
+
+
+def fetch_urls_threaded(jobs, concurrency=64, return_exceptions=False, timeout=30):
+    """Download urls from a thread pool sharing one keep-alive session.
+    Args:
+        jobs (list of (str, str)): (url, file_name) pairs to download
+        concurrency (int): max number of simultaneous connections
+        return_exceptions (bool): return the errors of failed downloads
+        instead of raising the first one
+        timeout (float): seconds to wait for a connection or for data from
+        the server before a download fails
+
+    Returns:
+        results (list): None for each successful download, in job order
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def _fetch(job):
+        url, file_name = job
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+        with open(file_name, "wb") as f:
+            f.write(response.content)
+
+    def _fetch_or_error(job):
+        try:
+            _fetch(job)
+        except Exception as e:
+            return e
+
+    with session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # consume the results so that the first failed download is raised
+        return list(
+            executor.map(_fetch_or_error if return_exceptions else _fetch, jobs)
+        )
+
+
+def download_urls(jobs, concurrency=64, return_exceptions=False, timeout=30):
+    """Download urls from synchronous code. Uses fetch_urls on a new event loop
+    if aiohttp is installed, and fetch_urls_threaded if it is not or if an
+    event loop is already running in this thread (e.g. inside Jupyter), where
+    asyncio.run is not allowed.
+    Args:
+        jobs (list of (str, str)): (url, file_name) pairs to download
+        concurrency (int): max number of simultaneous connections
+        return_exceptions (bool): return the errors of failed downloads
+        instead of raising the first one
+        timeout (float): seconds to wait for a connection or for data from
+        the server before a download fails
+
+    Returns:
+        results (list): None for each successful download, in job order
+    """
+    if aiohttp is not None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(
+                fetch_urls(jobs, concurrency, return_exceptions, timeout)
+            )
+    return fetch_urls_threaded(jobs, concurrency, return_exceptions, timeout)
+
+
+def bboxes_to_yolo(bboxes, img_width, img_height):
+    """Convert [x, y, width, height] pixel boxes to normalized YOLO boxes.
+    Args:
+        bboxes (array-like): (N, 4) array of [x, y, width, height] boxes
+        img_width (float): image width in pixels
+        img_height (float): image height in pixels
+
+    Returns:
+        boxes (numpy array): (N, 4) array of [x_center, y_center, width,
+        height] boxes, normalized by the image size
+    """
+    # float64 regardless of the input dtype, integer boxes would truncate to 0
+    bboxes = np.asarray(bboxes, dtype=np.float64)
+    yolo_boxes = np.empty(bboxes.shape, dtype=np.float64)
+    if njit is not None:
+        _bboxes_to_yolo_loop(bboxes, float(img_width), float(img_height), yolo_boxes)
+        return yolo_boxes
+
+    yolo_boxes[:, 0] = (bboxes[:, 0] + bboxes[:, 2] / 2.0) / img_width
+    yolo_boxes[:, 1] = (bboxes[:, 1] + bboxes[:, 3] / 2.0) / img_height
+    yolo_boxes[:, 2] = bboxes[:, 2] / img_width
+    yolo_boxes[:, 3] = bboxes[:, 3] / img_height
+    return yolo_boxes
+
+
+@functools.lru_cache(maxsize=None)
+def load_categories(json_path):
+    """Read a JSON file containing a list of LVIS categories. Results are
+    cached per path, so pipelines that filter the same file several times
+    only parse it once.
+    Args:
+        json_path (str): path to the 'lvis_categories.json' file
+
+    Returns:
+        categories (tuple of dict): category objects. Every caller gets the
+        same cached objects, so copy a category before modifying it.
+    """
+    with open(json_path, "rb") as f:
+        if orjson is None:
+            return tuple(json.loads(f.read()))
+        return tuple(orjson.loads(f.read()))
+
+
+def write_json(json_path, data):
+    """Write data to a JSON file, in the format of the category and detect
+    yaml files tracked in this repo (4-space indents, non-ASCII kept as is).
+    Args:
+        json_path (str): path of the JSON file to write
+        data (dict or list): JSON serializable data
+    """
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
 
 
 class LVIS:
-    def __init__(self, annotation_path):
+    def __init__(self, annotation_path, low_memory=False, cache_index=False):
         """Class for reading and visualizing annotations.
         Args:
-            annotation_path (str): location of annotation file
+            annotation_path (str or os.PathLike): location of annotation file
+            low_memory (bool): stream-parse the annotation file with ijson
+            instead of reading it into memory first. Slower, but peak memory
+            stays close to the size of the parsed dataset.
+            cache_index (bool): pickle the loaded dataset and index next to
+            the annotation file and reuse it while the annotation file is
+            not modified.
         """
         self.logger = logging.getLogger(__name__)
+
+        if cache_index:
+            cache_path = os.fspath(annotation_path) + ".idx.pkl"
+            if self._load_index_cache(annotation_path, cache_path):
+                return
+
         self.logger.info("Loading annotations.")
 
-        self.dataset = self._load_json(annotation_path)
+        if low_memory:
+            self.dataset = self._load_json_stream(annotation_path)
+        else:
+            self.dataset = self._load_json(annotation_path)
 
         assert (
             type(self.dataset) == dict
         ), "Annotation file format {} not supported.".format(type(self.dataset))
         self._create_index()
 
+        if cache_index:
+            self._save_index_cache(cache_path)
+
+    def _load_index_cache(self, annotation_path, cache_path):
+        # a missing annotation file is reported by the regular loading path
+        if not (os.path.exists(annotation_path) and os.path.exists(cache_path)):
+            return False
+        if os.path.getmtime(cache_path) < os.path.getmtime(annotation_path):
+            return False
+
+        self.logger.info("Loading cached index from {}.".format(cache_path))
+        try:
+            with open(cache_path, "rb") as f:
+                cache = pickle.load(f)
+        except Exception as e:
+            self.logger.warning(
+                "Ignoring unreadable index cache {}: {}".format(cache_path, e)
+            )
+            return False
+        if not isinstance(cache, dict) or cache.get("version") != _INDEX_CACHE_VERSION:
+            self.logger.info("Ignoring stale index cache {}.".format(cache_path))
+            return False
+        self.__dict__.update(cache["state"])
+        return True
+
+    def _save_index_cache(self, cache_path):
+        state = {k: v for k, v in vars(self).items() if k != "logger"}
+        # write to a temporary file first so that an interrupted run never
+        # leaves a truncated cache behind
+        tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        cache = {"version": _INDEX_CACHE_VERSION, "state": state}
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            # e.g. a read-only dataset directory; the index is still usable
+            self.logger.warning(
+                "Could not write index cache {}: {}".format(cache_path, e)
+            )
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
     def _load_json(self, path):
-        with open(path, "r") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            if orjson is None:
+                return json.loads(f.read())
+            # orjson parses straight out of the page cache, without copying the
+            # file into a bytes object first
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                with memoryview(mm) as buf:
+                    return orjson.loads(buf)
+            finally:
+                mm.close()
+
+    def _load_json_stream(self, path):
+        if ijson is None:
+            raise ImportError("low_memory loading requires ijson.")
+        with open(path, "rb") as f:
+            # top-level values are built incrementally from the file stream,
+            # the raw file contents are never held in memory at once
+            return dict(ijson.kvitems(f, "", use_float=True))
 
     def _create_index(self):
         self.logger.info("Creating index.")
 
-        self.img_ann_map = defaultdict(list)
-        self.cat_img_map = defaultdict(list)
+        self.img_ann_map = img_ann_map = defaultdict(list)
+        self.cat_img_map = cat_img_map = defaultdict(list)
+        self.cat_ann_map = cat_ann_map = defaultdict(list)
+
+        self.anns = anns = {}
+        self.cats = cats = {}
+        self.imgs = imgs = {}
+        self.img_hw = img_hw = {}
+
+        annotations = self.dataset["annotations"]
+        images = self.dataset["images"]
+        categories = self.dataset["categories"]
+
+        # single pass over the annotations; locals and bound methods avoid
+        # attribute lookups on self for every annotation
+        img_ann_map_get = img_ann_map.__getitem__
+        cat_img_map_get = cat_img_map.__getitem__
+        cat_ann_map_get = cat_ann_map.__getitem__
+        for ann in annotations:
+            ann_id, image_id, category_id = ann["id"], ann["image_id"], ann["category_id"]
+            img_ann_map_get(image_id).append(ann_id)
+            anns[ann_id] = ann
+            cat_img_map_get(category_id).append(image_id)
+            cat_ann_map_get(category_id).append(ann)
+
+        # columnar copies of the fields get_ann_ids filters on, so filtering
+        # the whole dataset is a few vectorized ops instead of a Python loop.
+        # They are read back from the index, so the annotations are iterated
+        # only once and may come from a single-use stream.
+        self._ann_ids = np.fromiter(anns, dtype=np.int64, count=len(anns))
+        self._ann_cat = np.fromiter(
+            map(itemgetter("category_id"), anns.values()),
+            dtype=np.int64,
+            count=len(anns),
+        )
+        self._ann_area = np.fromiter(
+            map(itemgetter("area"), anns.values()),
+            dtype=np.float64,
+            count=len(anns),
+        )
+
+        for img in images:
+            imgs[img["id"]] = img
+            # only the mask helpers need the size, an image without one must
+            # not fail the whole index
+            height, width = img.get("height"), img.get("width")
+            if height is not None and width is not None:
+                img_hw[img["id"]] = (height, width)
 
-        self.anns = {}
-        self.cats = {}
-        self.imgs = {}
-
-        for ann in self.dataset["annotations"]:
-            self.img_ann_map[ann["image_id"]].append(ann)
-            self.anns[ann["id"]] = ann
-
-        for img in self.dataset["images"]:
-            self.imgs[img["id"]] = img
+        for cat in categories:
+            cats[cat["id"]] = cat
 
-        for cat in self.dataset["categories"]:
-            self.cats[cat["id"]] = cat
+        # per-category results of get_image_ids / get_annotations
+        self._cat_img_ids_cache = {}
+        self._cat_ann_cache = {}
 
-        for ann in self.dataset["annotations"]:
-            self.cat_img_map[ann["category_id"]].append(ann["image_id"])
+        # every annotation is now reachable through self.anns; drop the
+        # dataset's list so it does not keep a second reference to each one
+        del self.dataset["annotations"]
 
         self.logger.info("Index created.")
 
@@ -69,34 +407,51 @@ class LVIS:
 
         Args:
             img_ids (int array): get anns for given imgs
-            cat_ids (int array): get anns for given cats
+            cat_ids (int array): get anns for given cats. Passing a set or
+            frozenset, e.g. frozenset((cat_id,)), skips the set conversion
             area_rng (float array): get anns for a given area range. e.g [0, inf]
 
         Returns:
             ids (int array): integer array of ann ids
         """
-        anns = []
-        if img_ids is not None:
-            for img_id in img_ids:
-                anns.extend(self.img_ann_map[img_id])
-        else:
-            anns = self.dataset["annotations"]
+        img_ann_map = self.img_ann_map
 
         # return early if no more filtering required
         if cat_ids is None and area_rng is None:
-            return [_ann["id"] for _ann in anns]
-
-        cat_ids = set(cat_ids)
-
-        if area_rng is None:
-            area_rng = [0, float("inf")]
+            if img_ids is None:
+                return list(self.anns)
+            return [ann_id for img_id in img_ids for ann_id in img_ann_map[img_id]]
+
+        lo, hi = _AREA_RNG_ALL if area_rng is None else area_rng
+
+        if cat_ids is not None and not isinstance(cat_ids, (set, frozenset)):
+            cat_ids = set(cat_ids)
+
+        if img_ids is None:
+            if cat_ids is None:
+                mask = (self._ann_area > lo) & (self._ann_area < hi)
+            elif njit is not None:
+                cats_sorted = np.unique(np.fromiter(cat_ids, dtype=np.int64))
+                mask = _cat_area_mask(
+                    self._ann_cat, self._ann_area, cats_sorted, float(lo), float(hi)
+                )
+            else:
+                mask = np.isin(self._ann_cat, np.fromiter(cat_ids, dtype=np.int64))
+                mask &= self._ann_area > lo
+                mask &= self._ann_area < hi
+            return self._ann_ids[mask].tolist()
+
+        anns_get = self.anns.__getitem__
+        anns = [
+            anns_get(ann_id) for img_id in img_ids for ann_id in img_ann_map[img_id]
+        ]
+        if cat_ids is None:
+            return [_ann["id"] for _ann in anns if lo < _ann["area"] < hi]
 
         ann_ids = [
             _ann["id"]
             for _ann in anns
-            if _ann["category_id"] in cat_ids
-            and _ann["area"] > area_rng[0]
-            and _ann["area"] < area_rng[1]
+            if _ann["category_id"] in cat_ids and lo < _ann["area"] < hi
         ]
         return ann_ids
 
@@ -120,8 +475,13 @@ class LVIS:
     def _load_helper(self, _dict, ids):
         if ids is None:
             return list(_dict.values())
-        else:
+
+        ids = tuple(ids)
+        # itemgetter returns a bare item instead of a tuple for a single id
+        # and cannot be built without any
+        if len(ids) <= 1:
             return [_dict[id] for id in ids]
+        return list(itemgetter(*ids)(_dict))
 
     def load_anns(self, ids=None):
         """Load anns with the specified ids. If ids=None load all anns.
@@ -157,21 +517,57 @@ class LVIS:
         """
         return self._load_helper(self.imgs, ids)
 
-    def download(self, save_dir, img_ids=None):
-        """Download images from mscoco.org server.
+    def get_download_jobs(self, save_dir, img_ids=None, existing=None):
+        """Get (url, file_name) pairs of images not yet present in save_dir.
         Args:
             save_dir (str): dir to save downloaded images
             img_ids (int array): img ids of images to download
-        """
-        imgs = self.load_imgs(img_ids)
-
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
+            existing (set): names of the files in save_dir. Listed from
+            save_dir if not given; pass it when calling this repeatedly for
+            the same directory
 
-        for img in imgs:
-            file_name = os.path.join(save_dir, img["coco_url"].split("/")[-1])
-            if not os.path.exists(file_name):
-                urlretrieve(img["coco_url"], file_name)
+        Returns:
+            jobs (list of (str, str)): urls and the file names to save them to
+        """
+        # list the directory once instead of stat-ing every image
+        if existing is None:
+            existing = set(os.listdir(save_dir)) if os.path.isdir(save_dir) else set()
+        jobs = []
+        append, join = jobs.append, os.path.join
+        for img in self.load_imgs(img_ids):
+            coco_url = img["coco_url"]
+            base_name = coco_url.rpartition("/")[2]
+            if base_name not in existing:
+                append((coco_url, join(save_dir, base_name)))
+        return jobs
+
+    async def download_async(self, save_dir, img_ids=None, concurrency=64):
+        """Download images from mscoco.org server concurrently. Without
+        aiohttp, the downloads run on a thread pool off the event loop.
+        Args:
+            save_dir (str): dir to save downloaded images
+            img_ids (int array): img ids of images to download
+            concurrency (int): max number of simultaneous downloads
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        jobs = self.get_download_jobs(save_dir, img_ids)
+        if aiohttp is not None:
+            await fetch_urls(jobs, concurrency)
+            return
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, fetch_urls_threaded, jobs, concurrency)
+
+    def download(self, save_dir, img_ids=None, concurrency=64):
+        """Download images from mscoco.org server. See download_urls for the
+        download backend used; async callers should use download_async.
+        Args:
+            save_dir (str): dir to save downloaded images
+            img_ids (int array): img ids of images to download
+            concurrency (int): max number of simultaneous downloads
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        download_urls(self.get_download_jobs(save_dir, img_ids), concurrency)
 
     def ann_to_rle(self, ann):
         """Convert annotation which can be polygons, uncompressed RLE to RLE.
@@ -181,8 +577,10 @@ class LVIS:
         Returns:
             ann (rle)
         """
-        img_data = self.imgs[ann["image_id"]]
-        h, w = img_data["height"], img_data["width"]
+        # imported lazily, scripts that never touch masks skip the cost
+        import pycocotools.mask as mask_utils
+
+        h, w = self.img_hw[ann["image_id"]]
         segm = ann["segmentation"]
         if isinstance(segm, list):
             # polygon -- a single object might consist of multiple parts
@@ -206,9 +604,66 @@ class LVIS:
         Returns:
             binary mask (numpy 2D array)
         """
+        import pycocotools.mask as mask_utils
+
         rle = self.ann_to_rle(ann)
         return mask_utils.decode(rle)
 
+    def anns_to_rles(self, anns):
+        """Convert a list of annotations to RLE. Polygons of all annotations
+        in the same image are converted with a single call.
+        Args:
+            anns (dict array) : annotation objects
+
+        Returns:
+            rles (rle array) : one rle per annotation, in the same order
+        """
+        import pycocotools.mask as mask_utils
+
+        rles = [None] * len(anns)
+        poly_idxs_by_img = defaultdict(list)
+        for idx, ann in enumerate(anns):
+            if isinstance(ann["segmentation"], list):
+                poly_idxs_by_img[ann["image_id"]].append(idx)
+            else:
+                rles[idx] = self.ann_to_rle(ann)
+
+        for img_id, idxs in poly_idxs_by_img.items():
+            h, w = self.img_hw[img_id]
+            polys = [poly for idx in idxs for poly in anns[idx]["segmentation"]]
+            poly_rles = mask_utils.frPyObjects(polys, h, w)
+            # merge the parts of each annotation into one mask rle code
+            start = 0
+            for idx in idxs:
+                end = start + len(anns[idx]["segmentation"])
+                rles[idx] = mask_utils.merge(poly_rles[start:end])
+                start = end
+        return rles
+
+    def anns_to_masks(self, anns):
+        """Convert a list of annotations to binary masks, decoding the masks
+        of each image with a single call.
+        Args:
+            anns (dict array) : annotation objects
+
+        Returns:
+            binary masks (numpy 2D array array) : one mask per annotation,
+            in the same order
+        """
+        import pycocotools.mask as mask_utils
+
+        rles = self.anns_to_rles(anns)
+        idxs_by_img = defaultdict(list)
+        for idx, ann in enumerate(anns):
+            idxs_by_img[ann["image_id"]].append(idx)
+
+        masks = [None] * len(anns)
+        for idxs in idxs_by_img.values():
+            decoded = mask_utils.decode([rles[idx] for idx in idxs])
+            for i, idx in enumerate(idxs):
+                masks[idx] = decoded[:, :, i]
+        return masks
+
 # -- custom functions below ---
 
     def get_cat(self):
@@ -217,23 +672,18 @@ class LVIS:
         Returns:
             ? (? array): string array of category names
         """
-        return self.dataset["categories"]
+        return list(self.cats.values())
 
     def get_cat_names(self):
         """
         Returns a list of category names (strings) from the LVIS dataset.
         By default, this returns the first synonym in each category's 'synonyms' list.
         """
-        cat_names = []
-        categories = self.dataset.get('categories', [])
-        
-        for cat in categories:
-            # Make sure 'synonyms' exists and has at least one element
-            if 'synonyms' in cat and cat['synonyms']:
-                cat_names.append(cat['synonyms'][0])
-            else:
-                # Fallback in case 'synonyms' is missing or empty
-                cat_names.append(None)
+        # Fall back to None in case 'synonyms' is missing or empty
+        cat_names = [
+            cat['synonyms'][0] if cat.get('synonyms') else None
+            for cat in self.cats.values()
+        ]
                 
         return cat_names
 
@@ -244,8 +694,8 @@ class LVIS:
         Args:
             csv_file_path (str): The path (including filename) where the CSV should be saved.
         """
-        # Extract category info from the dataset
-        categories = self.dataset.get('categories', [])
+        # Category info is already indexed by id, in dataset order
+        categories = self.cats.values()
 
         # Define the CSV header
         # If you prefer a different name than 'def' for the CSV column, change it here (e.g., "definition")
@@ -261,27 +711,25 @@ class LVIS:
 
         # Open the file and create a writer
         with open(csv_file_path, mode='w', newline='', encoding='utf-8') as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            writer = csv.writer(csv_file)
             
             # Write the header
-            writer.writeheader()
+            writer.writerow(fieldnames)
             
-            # Write each category to the CSV
-            for cat in categories:
-                # Convert list of synonyms to a single string (e.g., joined by '|')
-                synonyms_str = '|'.join(cat.get('synonyms', []))
-                
-                row_data = {
-                    'id': cat.get('id', ''),
-                    'synset': cat.get('synset', ''),
-                    'synonyms': synonyms_str,
-                    'def': cat.get('def', ''),
-                    'instance_count': cat.get('instance_count', ''),
-                    'image_count': cat.get('image_count', ''),
-                    'frequency': cat.get('frequency', '')
-                }
-                
-                writer.writerow(row_data)
+            # Write each category to the CSV, in the same order as fieldnames.
+            # The list of synonyms is joined into a single string by '|'.
+            writer.writerows(
+                (
+                    cat.get('id', ''),
+                    cat.get('synset', ''),
+                    '|'.join(cat.get('synonyms', [])),
+                    cat.get('def', ''),
+                    cat.get('instance_count', ''),
+                    cat.get('image_count', ''),
+                    cat.get('frequency', '')
+                )
+                for cat in categories
+            )
 
         print(f"Categories successfully written to {csv_file_path}")
 
@@ -305,59 +753,88 @@ class LVIS:
             csv_file_path (str): The path (including filename) for the CSV file.
         """
 
-        # 1) Identify all image_ids that contain this category.
-        image_ids_for_category = set()
-        for ann in self.dataset['annotations']:
-            if ann['category_id'] == category_id:
-                image_ids_for_category.add(ann['image_id'])
-
-        # 2) Filter annotations for those images AND matching the category_id.
-        relevant_annotations = []
-        for ann in self.dataset['annotations']:
-            if (ann['image_id'] in image_ids_for_category) and (ann['category_id'] == category_id):
-                relevant_annotations.append(ann)
+        # 1) + 2) The category index already holds exactly the annotations of
+        # this category, in dataset order; their images follow from them.
+        relevant_annotations = self.cat_ann_map.get(category_id, [])
+        image_ids_for_category = {ann['image_id'] for ann in relevant_annotations}
 
         # 3) Write the filtered annotations to CSV.
         fieldnames = ['id', 'image_id', 'category_id', 'segmentation', 'area', 'bbox']
         with open(csv_file_path, mode='w', newline='', encoding='utf-8') as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for ann in relevant_annotations:
-                row_data = {
-                    'id': ann.get('id', ''),
-                    'image_id': ann.get('image_id', ''),
-                    'category_id': ann.get('category_id', ''),
+            writer = csv.writer(csv_file)
+            writer.writerow(fieldnames)
+
+            writer.writerows(
+                (
+                    ann.get('id', ''),
+                    ann.get('image_id', ''),
+                    ann.get('category_id', ''),
                     # segmentation can be a list (polygon) or RLE. Convert as needed.
-                    'segmentation': ann.get('segmentation', ''),
-                    'area': ann.get('area', ''),
-                    'bbox': ann.get('bbox', '')  # Usually [x, y, width, height]
-                }
-                writer.writerow(row_data)
+                    ann.get('segmentation', ''),
+                    ann.get('area', ''),
+                    ann.get('bbox', '')  # Usually [x, y, width, height]
+                )
+                for ann in relevant_annotations
+            )
 
         print(f"Found {len(image_ids_for_category)} images for category_id={category_id}. "
             f"Wrote {len(relevant_annotations)} annotations to '{csv_file_path}'.")
 
 
     def get_image_ids(self, category_id):
-        # 1) Identify all image_ids containing this category
-        image_ids_for_category = set()
-        for ann in self.dataset['annotations']:
-            if ann['category_id'] == category_id:
-                image_ids_for_category.add(ann['image_id'])
+        """Get the ids of all images containing the given category.
+        Args:
+            category_id (int): the category to look up
+
+        Returns:
+            image_ids (frozenset): ids of the images. Memoized per category,
+            so it is immutable and the same object is returned on every call.
+        """
+        image_ids_for_category = self._cat_img_ids_cache.get(category_id)
+        if image_ids_for_category is None:
+            image_ids_for_category = frozenset(
+                ann['image_id'] for ann in self.cat_ann_map.get(category_id, [])
+            )
+            self._cat_img_ids_cache[category_id] = image_ids_for_category
         return image_ids_for_category
 
-    def get_annotations(self, category_id, image_ids_for_category):
-        # 2) Collect annotations that match both the category and the image_ids
-        relevant_annotations = []
-        for ann in self.dataset['annotations']:
-            if (ann['image_id'] in image_ids_for_category) and (ann['category_id'] == category_id):
-                relevant_annotations.append(ann)
+    def get_annotations(self, category_id, image_ids_for_category=None):
+        """Group the annotations of the given category by their image id.
+        Args:
+            category_id (int): the category to collect annotations of
+            image_ids_for_category (set): only keep the annotations of these
+            images, e.g. the result of get_image_ids
+
+        Returns:
+            image_id_to_annotations (defaultdict): image id -> tuple of
+            annotations, an empty tuple for images without any. A new mapping
+            on every call; the unfiltered grouping is memoized per category.
+        """
+        # Every annotation of a category lies in one of the images returned by
+        # get_image_ids, so passing exactly those does not filter anything
+        if image_ids_for_category is self._cat_img_ids_cache.get(category_id):
+            image_ids_for_category = None
+
+        if image_ids_for_category is None:
+            cached = self._cat_ann_cache.get(category_id)
+            if cached is not None:
+                return defaultdict(tuple, cached)
+
+        relevant_annotations = self.cat_ann_map.get(category_id, [])
+        if image_ids_for_category is not None:
+            relevant_annotations = [
+                ann for ann in relevant_annotations if ann['image_id'] in image_ids_for_category
+            ]
         # Group annotations by their image_id for easy lookup
-        image_id_to_annotations = defaultdict(list)
+        grouped = defaultdict(list)
         for ann in relevant_annotations:
-            image_id_to_annotations[ann['image_id']].append(ann)
-        return image_id_to_annotations
+            grouped[ann['image_id']].append(ann)
+        image_id_to_annotations = {
+            image_id: tuple(anns) for image_id, anns in grouped.items()
+        }
+        if image_ids_for_category is None:
+            self._cat_ann_cache[category_id] = image_id_to_annotations
+        return defaultdict(tuple, image_id_to_annotations)
 
     
     
@@ -410,26 +887,26 @@ class LVIS:
         # os.makedirs(images_folder_path, exist_ok=True)
         os.makedirs(labels_folder_path, exist_ok=True)
         # 1) Identify all image_ids containing this category
-        image_ids_for_category = set()
         image_ids_for_category = self.get_image_ids(category_id)
 
         # 2) Collect annotations that match both the category and the image_ids
         # Group annotations by their image_id for easy lookup
-        image_id_to_annotations = defaultdict(list)
-        image_id_to_annotations = self.get_annotations(category_id, image_ids_for_category)
+        image_id_to_annotations = self.get_annotations(category_id)
 
+        # List the label folder once instead of checking every label file
+        with os.scandir(labels_folder_path) as entries:
+            existing_label_files = {entry.name for entry in entries}
+
+        # Loop invariants: the folder prefix of every label path (with the
+        # trailing separator) and the class column, categories are zero-indexed
+        labels_folder_prefix = os.path.join(labels_folder_path, "")
+        class_prefix = f"{category_index} "
+        splitext = os.path.splitext
 
         # 3) Export YOLO labels
         imgs = self.load_imgs(image_ids_for_category)
         for img in imgs:
-            # file_name still includes .jpg at the end instead of .txt
             coco_url = img["coco_url"]
-            image_name = coco_url.split("/")[-1]
-            # replace the characters .jpg with .txt
-            base_name = os.path.splitext(image_name)[0]  # Removes the extension
-            label_file_name = base_name + '.txt'
-            # Construct the label file path (same base name, .txt extension)
-            label_file_path = os.path.join(labels_folder_path, label_file_name)
             img_width = img["width"]
             img_height = img["height"]
 
@@ -444,47 +921,56 @@ class LVIS:
             if not annotations_for_image:
                 continue
 
+            # Label file has the image's base name with a .txt extension
+            base_name = splitext(coco_url.rpartition("/")[2])[0]
+            label_file_name = f"{base_name}.txt"
+            label_file_path = f"{labels_folder_prefix}{label_file_name}"
+
+            # If the file exists, make sure to not overwrite. Do not delete the information that is already there.
+            # Gather existing lines once per image, so duplicate lines are skipped
+            if label_file_name in existing_label_files:
+                with open(label_file_path, 'r') as existing_file:
+                    # strip to remove trailing newline
+                    existing_lines = {line.strip() for line in existing_file}
+            else:
+                existing_lines = set()
 
-            for ann in annotations_for_image:
-                # 'bbox' is typically [x, y, width, height] in pixel coordinates
-                bbox = ann.get('bbox', None)
-                if not bbox or len(bbox) != 4:
-                    continue
-
-                x, y, w, h = bbox
-
-                # Convert to YOLO-style normalized coordinates
-                x_center = (x + w / 2.0) / img_width
-                y_center = (y + h / 2.0) / img_height
-                w_norm = w / img_width
-                h_norm = h / img_height
+            # 'bbox' is typically [x, y, width, height] in pixel coordinates
+            bboxes = [
+                ann['bbox'] for ann in annotations_for_image
+                if ann.get('bbox', None) and len(ann['bbox']) == 4
+            ]
+            if not bboxes:
+                continue
 
-                # Categories are zero-indexed
-                class_idx = category_index
+            # Convert to YOLO-style normalized coordinates, all boxes at once
+            yolo_boxes = bboxes_to_yolo(np.asarray(bboxes, dtype=np.float64), img_width, img_height)
 
-                # Write one line per bounding box
+            new_lines = []
+            add_line, append_line = existing_lines.add, new_lines.append
+            for x_center, y_center, w_norm, h_norm in yolo_boxes.tolist():
+                # One line per bounding box
                 # Format as floats; you can refine precision as needed
-                # Construct the line to be added
-                # Construct the single bounding-box line we want to add
-                bbox_line = f"{class_idx} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}"
-                # label_file.write(f"{class_idx} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}\n")
+                bbox_line = f"{class_prefix}{x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}"
 
-                # If the file exists, make sure to not overwrite. Do not delete the information that is already there.
-                # Gather existing lines if the file already exists
-                existing_lines = set()
-                if os.path.exists(label_file_path):
-                    with open(label_file_path, 'r') as existing_file:
-                        for line in existing_file:
-                            existing_lines.add(line.strip())  # strip to remove trailing newline
-                # If the file already contains what was to be written, skip
                 # If this line isn't already in the file, append it
                 if bbox_line not in existing_lines:
-                    with open(label_file_path, 'a') as label_file:
-                        label_file.write(bbox_line + "\n")
-    
-        
-
-    def download_and_export_labels(self, image_ids_for_category, image_id_to_annotations):
+                    add_line(bbox_line)
+                    append_line(bbox_line)
+
+            # Append all new lines of this image with a single write
+            if new_lines:
+                with open(label_file_path, 'a') as label_file:
+                    label_file.write("\n".join(new_lines) + "\n")
+
+    def download_and_export_labels(
+        self,
+        image_ids_for_category,
+        image_id_to_annotations,
+        images_folder_path,
+        labels_folder_path,
+        category_index,
+    ):
         """
         1) Gather all image IDs that have annotations for the specified category_id.
         2) From those images, collect only the annotations that match the same category_id.
@@ -495,14 +981,20 @@ class LVIS:
         - Class numbers are zero-indexed (start from 0).
 
         Args:
-            category_id (int): The category ID to filter on.
+            image_ids_for_category (int array): The images to download, see get_image_ids.
+            image_id_to_annotations (dict): Annotations grouped by image_id, see get_annotations.
             images_folder_path (str): The directory to save the images.
             labels_folder_path (str): The directory to save the YOLO label files.
+            category_index (int): The zero-indexed YOLO class of the category.
         """
-        # 3) Download each image and 4) export YOLO labels
+        imgs = self.imgs
+        join, splitext = os.path.join, os.path.splitext
+
+        # 3) Download all images concurrently
+        jobs = {}
         for image_id in image_ids_for_category:
-            # Find the image info from self.dataset['images']
-            image_info = next((img for img in self.dataset['images'] if img['id'] == image_id), None)
+            # Find the image info from the image index
+            image_info = imgs.get(image_id)
             if not image_info:
                 continue
 
@@ -516,58 +1008,48 @@ class LVIS:
             if not (coco_url and img_width and img_height):
                 continue
 
-            # Download the image
-            try:
-                response = requests.get(coco_url, timeout=15)
-                if response.status_code != 200:
-                    print(f"Warning: Failed to download image {image_id} from {coco_url}")
-                    continue
-            except requests.exceptions.RequestException as e:
-                print(f"Warning: Request error for image {image_id}: {e}")
+            jobs[image_id] = (coco_url, join(images_folder_path, file_name))
+
+        errors = download_urls(list(jobs.values()), return_exceptions=True, timeout=15)
+
+        # 4) Export YOLO labels for every downloaded image
+        for (image_id, (coco_url, image_path)), error in zip(jobs.items(), errors):
+            if error is not None:
+                print(f"Warning: Failed to download image {image_id} from {coco_url}: {error}")
                 continue
 
-            # Save the image file
-            image_path = os.path.join(images_folder_path, file_name)
-            with open(image_path, 'wb') as img_file:
-                img_file.write(response.content)
+            image_info = imgs[image_id]
+            file_name = image_info.get('file_name', f"{image_id}.jpg")
+            img_width = image_info['width']
+            img_height = image_info['height']
 
             # Gather bounding boxes for this image
-            annotations_for_image = image_id_to_annotations[image_id]
+            annotations_for_image = image_id_to_annotations.get(image_id)
 
             # If no bounding boxes for this category, do not create a label file
             if not annotations_for_image:
                 continue
 
             # Construct the label file path (same base name, .txt extension)
-            label_file_name = os.path.splitext(file_name)[0] + ".txt"
-            label_file_path = os.path.join(labels_folder_path, label_file_name)
+            label_file_name = splitext(file_name)[0] + ".txt"
+            label_file_path = join(labels_folder_path, label_file_name)
 
-            with open(label_file_path, 'w') as label_file:
-                for ann in annotations_for_image:
-                    # 'bbox' is typically [x, y, width, height] in pixel coordinates
-                    bbox = ann.get('bbox', None)
-                    if not bbox or len(bbox) != 4:
-                        continue
-
-                    x, y, w, h = bbox
-
-                    # Convert to YOLO-style normalized coordinates
-                    x_center = (x + w / 2.0) / img_width
-                    y_center = (y + h / 2.0) / img_height
-                    w_norm = w / img_width
-                    h_norm = h / img_height
+            # 'bbox' is typically [x, y, width, height] in pixel coordinates
+            bboxes = [
+                ann['bbox'] for ann in annotations_for_image
+                if ann.get('bbox', None) and len(ann['bbox']) == 4
+            ]
 
-                    # Categories are zero-indexed
-                    class_idx = category_index
+            # Convert to YOLO-style normalized coordinates, all boxes at once
+            yolo_boxes = bboxes_to_yolo(np.asarray(bboxes, dtype=np.float64).reshape(-1, 4), img_width, img_height)
 
-                    # Write one line per bounding box
-                    # Format as floats; you can refine precision as needed
-                    label_file.write(f"{class_idx} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}\n")
-
-    
-    
-
-    
-
-        
+            # Categories are zero-indexed
+            class_idx = category_index
 
+            # Write one line per bounding box
+            # Format as floats; you can refine precision as needed
+            with open(label_file_path, 'w') as label_file:
+                label_file.write("".join(
+                    f"{class_idx} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}\n"
+                    for x_center, y_center, w_norm, h_norm in yolo_boxes.tolist()
+                ))
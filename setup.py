@@ -20,12 +20,21 @@ DISTNAME = "lvis"
 DESCRIPTION = "Python API for LVIS dataset."
 AUTHOR = "Agrim Gupta"
 REQUIREMENTS = (reqs.strip().split("\n"),)
+# optional speedups, each code path falls back when its package is missing
+EXTRAS_REQUIRE = {
+    "json": ["orjson"],  # faster annotation loading
+    "lowmem": ["ijson"],  # LVIS(..., low_memory=True)
+    "async": ["aiohttp"],  # asyncio image downloads, download_async
+    "jit": ["numba"],  # compiled get_ann_ids filtering and YOLO box conversion
+}
+EXTRAS_REQUIRE["all"] = sorted({pkg for pkgs in EXTRAS_REQUIRE.values() for pkg in pkgs})
 
 
 if __name__ == "__main__":
     setuptools.setup(
         name=DISTNAME,
         install_requires=REQUIREMENTS,
+        extras_require=EXTRAS_REQUIRE,
         packages=setuptools.find_packages(),
         version="0.5.3",
         description=DESCRIPTION,